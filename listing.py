@@ -0,0 +1,105 @@
+import ijson
+
+ITEM_KEYS = ("data", "items")
+
+def parse_item(item):
+    if not isinstance(item, dict):
+        return None
+    title = item.get("title") or item.get("name") or "Unknown File"
+    download = item.get("download") or item.get("url") or item.get("link")
+    size = item.get("size") or item.get("filesize") or ""
+    if isinstance(download, str) and (download.startswith("http://") or download.startswith("https://")):
+        return (str(title), download, str(size))
+    return None
+
+def parse_listing(body):
+    if not isinstance(body, dict):
+        return []
+    arr = body.get("data") or body.get("items") or []
+    if not isinstance(arr, list):
+        return []
+    return [parsed for parsed in map(parse_item, arr) if parsed]
+
+# Incremental equivalent of `body.get("data") or body.get("items")`: the first
+# truthy key decides, and it only yields items if its value is a list.
+class ListingParser:
+    def __init__(self):
+        self.events = ijson.sendable_list()
+        self.coro = ijson.basic_parse_coro(self.events, use_float=True)
+        self.depth = 0
+        self.key = None
+        self.state = {}
+        self.results = {key: [] for key in ITEM_KEYS}
+        self.ignored = set()
+        self.builder = None
+        self.item_depth = 0
+
+    def send(self, chunk):
+        self.coro.send(chunk)
+        self._consume()
+
+    def close(self):
+        self.coro.close()
+        self._consume()
+
+    def result(self):
+        for key in ITEM_KEYS:
+            state = self.state.get(key)
+            if state == "nonempty":
+                return self.results[key]
+            if state == "truthy":
+                return []
+        return []
+
+    def _consume(self):
+        for event, value in self.events:
+            self._event(event, value)
+        del self.events[:]
+
+    def _event(self, event, value):
+        if self.builder is not None:
+            self.builder.event(event, value)
+            if event in ("start_map", "start_array"):
+                self.item_depth += 1
+            elif event in ("end_map", "end_array"):
+                self.item_depth -= 1
+            if self.item_depth == 0:
+                parsed = parse_item(self.builder.value)
+                if parsed:
+                    self.results[self.key].append(parsed)
+                self.builder = None
+            return
+        if event == "map_key":
+            if self.depth == 1:
+                self.key = value
+            elif self.depth == 2 and self.state.get(self.key) == "empty":
+                self._decide(self.key, "truthy")
+            return
+        if event in ("end_map", "end_array"):
+            self.depth -= 1
+            return
+        if self.depth == 1 and self.key in self.results and self.key not in self.ignored:
+            self.results[self.key] = []
+            if event == "start_array":
+                self.state[self.key] = "array"
+            elif event == "start_map" or not value:
+                self.state[self.key] = "empty"
+            else:
+                self._decide(self.key, "truthy")
+        elif self.depth == 2 and self.state.get(self.key) in ("array", "nonempty"):
+            if self.state[self.key] == "array":
+                self._decide(self.key, "nonempty")
+            if event in ("start_map", "start_array"):
+                self.builder = ijson.ObjectBuilder()
+                self.builder.event(event, value)
+                self.item_depth = 1
+                return
+        if event in ("start_map", "start_array"):
+            self.depth += 1
+
+    def _decide(self, key, state):
+        self.state[key] = state
+        for lower in ITEM_KEYS[ITEM_KEYS.index(key) + 1:]:
+            self.ignored.add(lower)
+            self.state.pop(lower, None)
+            self.results[lower] = []
@@ -1,19 +1,46 @@
-import os, html, time, logging, requests, threading, sys
-from urllib.parse import quote_plus, urlparse, parse_qs
-from http.server import BaseHTTPRequestHandler, HTTPServer
+import os, hmac, time, logging, sys, asyncio, signal, contextlib
+import aiohttp, ijson, orjson
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError
+from aiohttp import web
+from cachetools import TTLCache
+from urllib.parse import quote_plus
+from listing import ListingParser, parse_listing
 from telegram import Update
-from telegram.ext import ApplicationBuilder, CommandHandler, MessageHandler, ContextTypes, filters
+from telegram.constants import ParseMode
+from telegram.ext import Application, ApplicationBuilder, CommandHandler, Defaults, MessageHandler, ContextTypes, filters
 
 BOT_TOKEN = os.environ.get("BOT_TOKEN")
 if not BOT_TOKEN:
     raise RuntimeError("BOT_TOKEN not set")
 
-TERADL_PATTERN = "https://teradl.tiiny.io/?key=RushVx&link={link}"
+TERADL_PREFIX = "https://teradl.tiiny.io/?key=RushVx&link="
+FOOTER = "\n\n— Powered by @Regnis"
 COOLDOWN_SECONDS = 15
+COOLDOWN_MAX_USERS = 200_000
+RESPONSE_CACHE_SIZE = 2048
+RESPONSE_CACHE_TTL = 300
 HTTP_TIMEOUT = 20
+POLL_TIMEOUT = 20
+HTTP_POOL_SIZE = 50
+HTTP_RETRIES = 2
+HTTP_RETRY_BACKOFF = 0.1
+STREAM_THRESHOLD = 1024 * 1024
 WEB_PORT = int(os.environ.get("PORT", 8080))
 WEB_HOST = "0.0.0.0"
+KEEPALIVE_ENABLED = os.environ.get("KEEPALIVE", "1").lower() not in ("0", "false", "no")
 KEEPALIVE_SECRET = os.environ.get("KEEPALIVE_SECRET")
+KEEPALIVE_SECRET_BYTES = KEEPALIVE_SECRET.encode("utf-8") if KEEPALIVE_SECRET else None
+PUBLIC_URL = os.environ.get("PUBLIC_URL")
+REDIS_URL = os.environ.get("REDIS_URL")
+HEARTBEAT_URL = os.environ.get("HEARTBEAT_URL")
+WEB_WORKERS = int(os.environ.get("WEB_WORKERS", 1))
+if WEB_WORKERS > 1 and PUBLIC_URL and not REDIS_URL:
+    raise RuntimeError("REDIS_URL must be set when WEB_WORKERS > 1")
+HEARTBEAT_INTERVAL = COOLDOWN_SECONDS * 4
+WEBHOOK_PATH = os.environ.get("WEBHOOK_PATH", "/telegram")
+WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET") or hmac.new(BOT_TOKEN.encode("utf-8"), b"webhook", "sha256").hexdigest()
+WEBHOOK_SECRET_BYTES = WEBHOOK_SECRET.encode("utf-8")
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -21,83 +48,130 @@ logger = logging.getLogger(__name__)
 start_time = time.time()
 last_user_activity = None
 last_ping = None
-user_cooldown = {}
+user_cooldown = TTLCache(maxsize=COOLDOWN_MAX_USERS, ttl=COOLDOWN_SECONDS, timer=time.time)
+response_cache = TTLCache(maxsize=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL)
+HTTP_SESSION = None
+REDIS = None
+WEB_RUNNER = None
+HEARTBEAT_TASK = None
+PRIMARY_WORKER = True
+BOT_APP_KEY = web.AppKey("bot_app", Application)
 
 def build_api_url(shared_link: str) -> str:
-    return TERADL_PATTERN.format(link=quote_plus(shared_link))
-
-def parse_json(data):
-    results = []
-    if not isinstance(data, dict):
-        return results
-    arr = data.get("data") or data.get("items") or []
-    if not isinstance(arr, list):
-        return results
-    for item in arr:
-        if not isinstance(item, dict):
-            continue
-        title = item.get("title") or item.get("name") or "Unknown File"
-        download = item.get("download") or item.get("url") or item.get("link")
-        size = item.get("size") or item.get("filesize") or ""
-        if isinstance(download, str) and (download.startswith("http://") or download.startswith("https://")):
-            results.append((str(title), download, str(size)))
-    return results
-
-def _require_token_qs(path_qs):
-    if not KEEPALIVE_SECRET:
+    return TERADL_PREFIX + quote_plus(shared_link, safe="")
+
+_TRANS = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;"})
+
+def _esc(s, _t=_TRANS):
+    return s.translate(_t)
+
+def _line(title, link, size):
+    return f'<a href="{_esc(link)}">{_esc(title)}</a>' + (f" — {_esc(size)}" if size else "")
+
+async def stream_items(stream):
+    parser = ListingParser()
+    async for chunk in stream.iter_any():
+        parser.send(chunk)
+    parser.close()
+    return parser.result()
+
+def _require_token(request):
+    if not KEEPALIVE_SECRET_BYTES:
         return True
-    qs = parse_qs(urlparse(path_qs).query)
-    token_vals = qs.get("token") or []
-    return (token_vals and token_vals[0] == KEEPALIVE_SECRET)
-
-class _SimpleHandler(BaseHTTPRequestHandler):
-    def _send_json(self, payload, status=200):
-        data = (str(payload).replace("'", '"')).encode("utf-8")
-        self.send_response(status)
-        self.send_header("Content-Type", "application/json")
-        self.send_header("Content-Length", str(len(data)))
-        self.end_headers()
-        self.wfile.write(data)
-
-    def do_HEAD(self):
-        self.send_response(200)
-        self.send_header("Content-Length", "0")
-        self.end_headers()
-
-    def do_GET(self):
-        path = urlparse(self.path).path
-        if path == "/ping":
-            if not _require_token_qs(self.path):
-                self._send_json({"ok": False, "error": "invalid token"}, status=403)
-                return
-            global last_ping
-            last_ping = int(time.time())
-            self._send_json({"ok": True, "timestamp": last_ping})
-            return
-        if path == "/health":
-            if not _require_token_qs(self.path):
-                self._send_json({"ok": False, "error": "invalid token"}, status=403)
-                return
-            now = int(time.time())
-            self._send_json({
-                "ok": True,
-                "uptime": int(now - start_time),
-                "pid": os.getpid(),
-                "last_user_activity": int(last_user_activity) if last_user_activity else None,
-                "last_ping": int(last_ping) if last_ping else None,
-                "time": now
-            })
-            return
-        self.send_response(200)
-        self.send_header("Content-Type", "text/plain")
-        self.end_headers()
-        self.wfile.write(b"OK")
-
-def run_keepalive_server_in_thread(host: str, port: int):
-    server = HTTPServer((host, port), _SimpleHandler)
-    t = threading.Thread(target=server.serve_forever, daemon=True)
-    t.start()
-    logger.info("Keep-alive server started on %s:%s", host, port)
+    token = request.query.get("token")
+    return bool(token) and hmac.compare_digest(token.encode("utf-8"), KEEPALIVE_SECRET_BYTES)
+
+def _json_response(payload, status=200):
+    return web.Response(body=orjson.dumps(payload), status=status, content_type="application/json")
+
+async def handle_ping(request):
+    if not _require_token(request):
+        return _json_response({"ok": False, "error": "invalid token"}, status=403)
+    global last_ping
+    last_ping = int(time.time())
+    return _json_response({"ok": True, "timestamp": last_ping})
+
+async def handle_health(request):
+    if not _require_token(request):
+        return _json_response({"ok": False, "error": "invalid token"}, status=403)
+    now = int(time.time())
+    return _json_response({
+        "ok": True,
+        "uptime": int(now - start_time),
+        "pid": os.getpid(),
+        "last_user_activity": int(last_user_activity) if last_user_activity else None,
+        "last_ping": int(last_ping) if last_ping else None,
+        "time": now
+    })
+
+async def handle_root(request):
+    return web.Response(text="OK")
+
+async def handle_head(request):
+    return web.Response()
+
+async def handle_webhook(request):
+    token = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+    if not hmac.compare_digest(token.encode("utf-8"), WEBHOOK_SECRET_BYTES):
+        return _json_response({"ok": False, "error": "invalid token"}, status=403)
+    bot_app = request.app[BOT_APP_KEY]
+    update = Update.de_json(await request.json(loads=orjson.loads), bot_app.bot)
+    await bot_app.update_queue.put(update)
+    return web.Response()
+
+def build_web_app(app):
+    web_app = web.Application()
+    web_app[BOT_APP_KEY] = app
+    if PUBLIC_URL:
+        web_app.router.add_post(WEBHOOK_PATH, handle_webhook)
+    web_app.router.add_get("/ping", handle_ping, allow_head=False)
+    web_app.router.add_get("/health", handle_health, allow_head=False)
+    web_app.router.add_get("/{tail:.*}", handle_root, allow_head=False)
+    web_app.router.add_route("HEAD", "/{tail:.*}", handle_head)
+    return web_app
+
+async def start_keepalive(app):
+    global WEB_RUNNER
+    WEB_RUNNER = web.AppRunner(build_web_app(app))
+    await WEB_RUNNER.setup()
+    site = web.TCPSite(WEB_RUNNER, WEB_HOST, WEB_PORT, reuse_port=bool(PUBLIC_URL) and WEB_WORKERS > 1)
+    await site.start()
+    logger.info("Keep-alive server started on %s:%s", WEB_HOST, WEB_PORT)
+
+async def stop_keepalive(app):
+    if WEB_RUNNER is not None:
+        await WEB_RUNNER.cleanup()
+
+async def fetch_items(api_url: str):
+    attempt = 0
+    while True:
+        try:
+            async with HTTP_SESSION.get(api_url) as resp:
+                resp.raise_for_status()
+                if resp.content_length is None or resp.content_length > STREAM_THRESHOLD:
+                    return await stream_items(resp.content)
+                return parse_listing(orjson.loads(await resp.read()))
+        except (aiohttp.ClientConnectorError, aiohttp.ServerDisconnectedError):
+            if attempt >= HTTP_RETRIES:
+                raise
+            await asyncio.sleep(HTTP_RETRY_BACKOFF * (2 ** attempt))
+            attempt += 1
+
+async def cooldown_remaining(user_id: int, now: float):
+    if REDIS is not None:
+        key = f"cd:{user_id}"
+        try:
+            async with REDIS.pipeline(transaction=True) as pipe:
+                count, _, ttl = await pipe.incr(key).expire(key, COOLDOWN_SECONDS, nx=True).ttl(key).execute()
+        except RedisError as e:
+            logger.warning("Redis cooldown check failed, using local cooldown: %s", e)
+        else:
+            return max(ttl, 0) if count > 1 else None
+    last = user_cooldown.get(user_id)
+    if last is not None:
+        return int(COOLDOWN_SECONDS - (now - last))
+    user_cooldown[user_id] = now
+    return None
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text("Send me a Terabox link.\n— Powered by @Regnis")
@@ -107,63 +181,193 @@ async def help_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def handle(update: Update, context: ContextTypes.DEFAULT_TYPE):
     global last_user_activity
-    last_user_activity = time.time()
+    now = last_user_activity = time.time()
     user = update.effective_user
     if not user:
         return
-    user_id = user.id
-    now = time.time()
-    last = user_cooldown.get(user_id, 0)
-    if now - last < COOLDOWN_SECONDS:
-        remaining = int(COOLDOWN_SECONDS - (now - last))
-        await update.message.reply_text(f"Slow down. Try again in {remaining}s.\n— Powered by @Regnis")
+    message = update.message
+    reply = message.reply_text
+    remaining = await cooldown_remaining(user.id, now)
+    if remaining is not None:
+        await reply(f"Slow down. Try again in {remaining}s.\n— Powered by @Regnis")
         return
-    user_cooldown[user_id] = now
-    text = (update.message.text or "").strip()
+    text = (message.text or "").strip()
     if not text:
-        await update.message.reply_text("Invalid link.\n— Powered by @Regnis")
+        await reply("Invalid link.\n— Powered by @Regnis")
         return
     if "teradl.tiiny.io" in text:
         api_url = text
     else:
         api_url = build_api_url(text)
-    info_msg = await update.message.reply_text("Fetching…")
+    cached = response_cache.get(api_url)
+    if cached is not None:
+        await reply(cached)
+        return
+    info_msg = await reply("Fetching…")
     try:
-        resp = requests.get(api_url, timeout=HTTP_TIMEOUT)
-        resp.raise_for_status()
-        data = resp.json()
+        items = await fetch_items(api_url)
+    except asyncio.TimeoutError:
+        await info_msg.edit_text("Error: upstream timed out\n— Powered by @Regnis")
+        return
+    except (ijson.JSONError, orjson.JSONDecodeError):
+        await info_msg.edit_text("Error: invalid response from upstream\n— Powered by @Regnis")
+        return
     except Exception as e:
-        await info_msg.edit_text(f"Error: {e}\n— Powered by @Regnis")
+        await info_msg.edit_text(f"Error: {_esc(str(e))}\n— Powered by @Regnis")
         return
-    items = parse_json(data)
     if not items:
         await info_msg.edit_text("No downloadable items.\n— Powered by @Regnis")
         return
-    lines = []
-    for title, link, size in items:
-        safe_title = html.escape(title)
-        safe_link = html.escape(link)
-        line = f'<a href="{safe_link}">{safe_title}</a>'
-        if size:
-            line += f" — {html.escape(size)}"
-        lines.append(line)
-    lines.append("")
-    lines.append("— Powered by @Regnis")
-    final = "\n".join(lines)
+    final = "\n".join(_line(*item) for item in items) + FOOTER
+    response_cache[api_url] = final
     try:
         await info_msg.edit_text("Done.")
     except:
         pass
-    await update.message.reply_text(final, parse_mode="HTML", disable_web_page_preview=True)
+    await reply(final)
 
-def main():
-    run_keepalive_server_in_thread(WEB_HOST, WEB_PORT)
-    app = ApplicationBuilder().token(BOT_TOKEN).build()
+async def open_http_session(app):
+    global HTTP_SESSION
+    HTTP_SESSION = aiohttp.ClientSession(
+        timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT),
+        connector=aiohttp.TCPConnector(limit=100, limit_per_host=HTTP_POOL_SIZE, keepalive_timeout=75),
+    )
+
+async def close_http_session(app):
+    if HTTP_SESSION is not None:
+        await HTTP_SESSION.close()
+
+async def open_redis(app):
+    global REDIS
+    if REDIS_URL:
+        REDIS = aioredis.from_url(REDIS_URL)
+
+async def close_redis(app):
+    if REDIS is not None:
+        await REDIS.aclose()
+
+async def heartbeat():
+    while True:
+        try:
+            async with HTTP_SESSION.post(HEARTBEAT_URL) as resp:
+                resp.raise_for_status()
+        except Exception as e:
+            logger.warning("Heartbeat to %s failed: %s", HEARTBEAT_URL, e)
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+
+async def start_heartbeat(app):
+    global HEARTBEAT_TASK
+    if HEARTBEAT_URL and PRIMARY_WORKER:
+        HEARTBEAT_TASK = asyncio.create_task(heartbeat())
+
+async def stop_heartbeat(app):
+    if HEARTBEAT_TASK is not None:
+        HEARTBEAT_TASK.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await HEARTBEAT_TASK
+
+async def on_startup(app):
+    await open_http_session(app)
+    await open_redis(app)
+    if PUBLIC_URL or KEEPALIVE_ENABLED:
+        await start_keepalive(app)
+    await start_heartbeat(app)
+
+async def on_shutdown(app):
+    await stop_heartbeat(app)
+    await stop_keepalive(app)
+    await close_redis(app)
+    await close_http_session(app)
+
+async def run_webhook(app, primary=True):
+    global PRIMARY_WORKER
+    PRIMARY_WORKER = primary
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    async with app:
+        await app.post_init(app)
+        if primary:
+            await app.bot.set_webhook(url=PUBLIC_URL.rstrip("/") + WEBHOOK_PATH, allowed_updates=[Update.MESSAGE], secret_token=WEBHOOK_SECRET)
+        await app.start()
+        try:
+            await stop.wait()
+        finally:
+            await app.stop()
+            await app.post_shutdown(app)
+
+def run_webhook_workers(count):
+    children = []
+    for index in range(count):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                asyncio.run(run_webhook(build_application(), primary=index == 0))
+            except Exception:
+                logger.exception("Worker %s crashed", index)
+                code = 1
+            finally:
+                os._exit(code)
+        children.append(pid)
+    logger.info("Started %s webhook workers on %s:%s", count, WEB_HOST, WEB_PORT)
+
+    def forward(signum, frame):
+        for pid in children:
+            with contextlib.suppress(ProcessLookupError):
+                os.kill(pid, signum)
+
+    signal.signal(signal.SIGINT, forward)
+    signal.signal(signal.SIGTERM, forward)
+    running = set(children)
+    failed = False
+    while running:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        running.discard(pid)
+        code = os.waitstatus_to_exitcode(status)
+        if code != 0 and not failed:
+            failed = True
+            logger.error("Worker %s exited with %s, stopping the remaining workers", pid, code)
+            for other in running:
+                with contextlib.suppress(ProcessLookupError):
+                    os.kill(other, signal.SIGTERM)
+    if failed:
+        sys.exit(1)
+
+def build_application():
+    defaults = Defaults(parse_mode=ParseMode.HTML, disable_web_page_preview=True, block=False)
+    builder = ApplicationBuilder().token(BOT_TOKEN).defaults(defaults).post_init(on_startup).post_shutdown(on_shutdown)
+    if PUBLIC_URL:
+        builder = builder.updater(None)
+    app = builder.build()
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("help", help_cmd))
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle))
+    return app
+
+def main():
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
+    if PUBLIC_URL and WEB_WORKERS > 1:
+        logger.info("Bot started (webhook, %s workers)...", WEB_WORKERS)
+        run_webhook_workers(WEB_WORKERS)
+        return
+    if WEB_WORKERS > 1:
+        logger.warning("WEB_WORKERS ignored in polling mode; Telegram allows one getUpdates consumer")
+    app = build_application()
+    if PUBLIC_URL:
+        logger.info("Bot started (webhook)...")
+        asyncio.run(run_webhook(app))
+        return
     logger.info("Bot started (polling)...")
-    app.run_polling()
+    app.run_polling(timeout=POLL_TIMEOUT, poll_interval=0.0, drop_pending_updates=False, allowed_updates=[Update.MESSAGE])
 
 if __name__ == "__main__":
     main()
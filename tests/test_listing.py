@@ -0,0 +1,71 @@
+import json, unittest
+from listing import ListingParser, parse_listing
+
+def parse_json(data):
+    results = []
+    if not isinstance(data, dict):
+        return results
+    arr = data.get("data") or data.get("items") or []
+    if not isinstance(arr, list):
+        return results
+    for item in arr:
+        if not isinstance(item, dict):
+            continue
+        title = item.get("title") or item.get("name") or "Unknown File"
+        download = item.get("download") or item.get("url") or item.get("link")
+        size = item.get("size") or item.get("filesize") or ""
+        if isinstance(download, str) and (download.startswith("http://") or download.startswith("https://")):
+            results.append((str(title), download, str(size)))
+    return results
+
+FILE = {"title": "a.mp4", "download": "https://x/a", "size": "12 MB"}
+OTHER = {"name": "b.zip", "url": "https://x/b"}
+
+FIXTURES = [
+    {"data": [FILE, OTHER]},
+    {"items": [OTHER]},
+    {"data": [], "items": [OTHER]},
+    {"items": [OTHER], "data": [FILE]},
+    {"items": [OTHER], "data": []},
+    {"data": {"item": FILE}},
+    {"data": "ok", "items": [OTHER]},
+    {"data": {}, "items": [OTHER]},
+    {"data": 0, "items": [OTHER]},
+    {"data": None, "items": [OTHER]},
+    {"data": [5, "x", [FILE], {"title": "t", "link": "ftp://x"}], "items": [OTHER]},
+    {"data": [{"title": "n", "link": "https://x/n", "size": 3, "meta": {"tags": [1, {"a": []}]}}]},
+    {"meta": {"data": [FILE]}},
+    [FILE],
+    "data",
+]
+
+class ListingParserTest(unittest.TestCase):
+    def parse(self, body, chunk_size):
+        raw = json.dumps(body).encode("utf-8")
+        parser = ListingParser()
+        for i in range(0, len(raw), chunk_size):
+            parser.send(raw[i:i + chunk_size])
+        parser.close()
+        return parser.result()
+
+    def test_matches_baseline_parse_json(self):
+        for body in FIXTURES:
+            for chunk_size in (1, 7, 4096):
+                with self.subTest(body=body, chunk_size=chunk_size):
+                    self.assertEqual(self.parse(body, chunk_size), parse_json(body))
+
+    def test_parse_listing_matches_baseline_parse_json(self):
+        for body in FIXTURES:
+            with self.subTest(body=body):
+                self.assertEqual(parse_listing(body), parse_json(body))
+
+    def test_lower_priority_key_dropped_once_data_has_items(self):
+        raw = json.dumps({"data": [FILE], "items": [OTHER, OTHER]}).encode("utf-8")
+        parser = ListingParser()
+        parser.send(raw)
+        self.assertEqual(parser.results["items"], [])
+        parser.close()
+        self.assertEqual(parser.result(), parse_json({"data": [FILE]}))
+
+if __name__ == "__main__":
+    unittest.main()